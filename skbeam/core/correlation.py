@@ -46,7 +46,11 @@ from __future__ import absolute_import, division, print_function
 from .utils import multi_tau_lags
 from .roi import extract_label_indices
 from collections import namedtuple
+import sys
+import threading
 import numpy as np
+import six
+from six.moves import queue
 from scipy.signal import fftconvolve
 # for a convenient status bar
 try:
@@ -55,14 +59,46 @@ except ImportError:
     def tqdm(iterator):
         return iterator
 
+# numba is optional. Without it the numpy reference implementations are
+# used and the kernels below still work, just as (slow) plain python.
+# Older versions of numba lack options used by the kernels, so they are
+# treated as missing.
+try:
+    import numba
+    _has_numba = tuple(
+        int(x) for x in numba.__version__.split('.')[:2]) >= (0, 49)
+except ImportError:
+    _has_numba = False
+
+if _has_numba:
+    from numba import get_num_threads, njit, prange
+else:
+    prange = range
+
+    def get_num_threads():
+        return 1
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
 
 import logging
 logger = logging.getLogger(__name__)
 
+# `fastmath=True` implies 'nnan', which would allow LLVM to fold away the
+# np.nan checks used to flag bad images, so only the safe flags are enabled
+_fastmath = {'reassoc', 'contract', 'arcp', 'nsz'}
+
+# number of pixels per block in the numba one time kernel; 16 kB of single
+# precision pixels, so a block of the future image stays in L1 cache
+_block_size = 4096
+
 
 def _one_time_process(buf, G, past_intensity_norm, future_intensity_norm,
-                      label_array, num_bufs, num_pixels, img_per_level,
-                      level, buf_no, norm, lev_len):
+                      num_bufs, inv_num_pixels, img_per_level, level, buf_no,
+                      norm, roi_ptr):
     """Reference implementation of the inner loop of multi-tau one time
     correlation
 
@@ -74,19 +110,18 @@ def _one_time_process(buf, G, past_intensity_norm, future_intensity_norm,
     Parameters
     ----------
     buf : array
-        image data array to use for correlation
+        image data array to use for correlation, the ROI pixels of every
+        buffered image (see `_validate_and_transform_inputs`)
     G : array
         matrix of auto-correlation function without normalizations
     past_intensity_norm : array
         matrix of past intensity normalizations
     future_intensity_norm : array
         matrix of future intensity normalizations
-    label_array : array
-        labeled array where all nonzero values are ROIs
     num_bufs : int, even
         number of buffers(channels)
-    num_pixels : array
-        number of pixels in certain ROI's
+    inv_num_pixels : array
+        reciprocals of the number of pixels in certain ROI's
         ROI's, dimensions are : [number of ROI's]X1
     img_per_level : array
         to track how many images processed in each level
@@ -94,10 +129,12 @@ def _one_time_process(buf, G, past_intensity_norm, future_intensity_norm,
         the current multi-tau level
     buf_no : int
         the current buffer number
-    norm : dict
-        to track bad images
-    lev_len : array
-        length of each level
+    norm : array
+        number of bad images skipped at each lag
+    roi_ptr : array
+        the pixels of ROI ``q`` are ``roi_ptr[q]:roi_ptr[q + 1]`` in the
+        (ROI sorted) images of `buf`
+        shape (number of ROI's + 1)
 
     Notes
     -----
@@ -112,31 +149,334 @@ def _one_time_process(buf, G, past_intensity_norm, future_intensity_norm,
     # in multi-tau correlation, the subsequent levels have half as many
     # buffers as the first
     i_min = num_bufs // 2 if level else 0
-    for i in range(i_min, min(img_per_level[level], num_bufs)):
-        # compute the index into the autocorrelation matrix
-        t_index = level * num_bufs // 2 + i
-        delay_no = (buf_no - i) % num_bufs
+    # a higher level has no delays to correlate until it has buffered
+    # more than half of its images
+    if img_per_level[level] <= i_min:
+        return None
+    # all the delays of this level are correlated at once
+    delays = np.arange(i_min, min(img_per_level[level], num_bufs))
+    # compute the indices into the autocorrelation matrix
+    t_index = level * num_bufs // 2 + delays
+
+    # get the images for correlating
+    past_imgs = buf[level, (buf_no - delays) % num_bufs]
+    future_img = buf[level, buf_no]
+
+    # find the normalization that can work both for bad_images
+    #  and good_images
+    normalize = img_per_level[level] - delays - norm[t_index]
+
+    # take out the past_ing and future_img created using bad images
+    # (bad images are converted to np.nan array)
+    bad = np.isnan(past_imgs).any(axis=1) | np.isnan(future_img).any()
+    norm[t_index[bad]] += 1
+    good = ~bad
+    t_index = t_index[good]
+    # divide once per delay, the running means below multiply
+    inv_normalize = 1.0 / normalize[good, np.newaxis]
+    past_imgs = past_imgs[good]
+
+    # the pixels are sorted by ROI, so the quantities are summed per ROI
+    # with streaming reductions, one row per delay. The future image is
+    # the same for every delay, so it is only reduced once. The buffered
+    # images are single precision, the products and sums are computed in
+    # double precision.
+    starts = roi_ptr[:-1]
+    g_binned = np.add.reduceat(
+        np.multiply(past_imgs, future_img, dtype=np.float64), starts, axis=1)
+    p_binned = np.add.reduceat(past_imgs, starts, axis=1, dtype=np.float64)
+    f_binned = np.add.reduceat(future_img, starts, dtype=np.float64)
+
+    # update the running means of all the delays of this level in place.
+    # The rows gathered from the results are already a copy, so the
+    # difference is computed into them; f_binned has a single row for all
+    # the delays and could not hold it.
+    for binned, arr in zip([g_binned, p_binned, f_binned],
+                           [G, past_intensity_norm, future_intensity_norm]):
+        binned *= inv_num_pixels
+        delta = arr[t_index]
+        np.subtract(binned, delta, out=delta)
+        delta *= inv_normalize
+        arr[t_index] += delta
+    return None  # modifies arguments in place!
+
+
+@njit(cache=True)
+def _has_nan(arr):
+    """Return True if any element of the 1D array `arr` is np.nan"""
+    for x in arr:
+        if np.isnan(x):
+            return True
+    return False
 
-        # get the images for correlating
-        past_img = buf[level, delay_no]
-        future_img = buf[level, buf_no]
 
-        # find the normalization that can work both for bad_images
-        #  and good_images
-        ind = int(t_index - lev_len[:level].sum())
-        normalize = img_per_level[level] - i - norm[level+1][ind]
+@njit(cache=True, boundscheck=False, fastmath=_fastmath)
+def _roi_sums(past_img, future_img, start, stop):
+    """Sum past*future, past and future over the pixels ``start:stop``
 
-        # take out the past_ing and future_img created using bad images
-        # (bad images are converted to np.nan array)
-        if np.isnan(past_img).any() or np.isnan(future_img).any():
-            norm[level + 1][ind] += 1
+    Every sum is split over four independent accumulators, so that the
+    additions do not form a single dependency chain and can be vectorized.
+    The (single precision) pixels are promoted to double precision as they
+    are read.
+    """
+    g0 = g1 = g2 = g3 = 0.0
+    p0 = p1 = p2 = p3 = 0.0
+    f0 = f1 = f2 = f3 = 0.0
+    k = start
+    while k + 4 <= stop:
+        a0 = np.float64(past_img[k])
+        a1 = np.float64(past_img[k + 1])
+        a2 = np.float64(past_img[k + 2])
+        a3 = np.float64(past_img[k + 3])
+        b0 = np.float64(future_img[k])
+        b1 = np.float64(future_img[k + 1])
+        b2 = np.float64(future_img[k + 2])
+        b3 = np.float64(future_img[k + 3])
+        g0 += a0 * b0
+        g1 += a1 * b1
+        g2 += a2 * b2
+        g3 += a3 * b3
+        p0 += a0
+        p1 += a1
+        p2 += a2
+        p3 += a3
+        f0 += b0
+        f1 += b1
+        f2 += b2
+        f3 += b3
+        k += 4
+    # remainder
+    while k < stop:
+        a0 = np.float64(past_img[k])
+        b0 = np.float64(future_img[k])
+        g0 += a0 * b0
+        p0 += a0
+        f0 += b0
+        k += 1
+    return (g0 + g1) + (g2 + g3), (p0 + p1) + (p2 + p3), (f0 + f1) + (f2 + f3)
+
+
+@njit(cache=True, parallel=True, fastmath=_fastmath)
+def _one_time_process_kernel(buf, G, past_intensity_norm,
+                             future_intensity_norm, roi_ptr, num_bufs,
+                             inv_num_pixels, img_per_level, level, buf_no,
+                             norm, delay_index, inv_normalize, roi_sums):
+    """Numba implementation of `_one_time_process`
+
+    For every delay the products and the intensities are summed per ROI
+    in a single pass over its pixels, instead of the reductions (and
+    temporaries) of `_one_time_process`. The ROIs are processed in
+    parallel; each one only writes to its own column of the results.
+
+    The pixels of a ROI are visited in blocks of `_block_size` and every
+    delay is correlated with a block before moving on to the next one, so
+    the future image block stays in cache instead of being read from
+    memory once per delay.
+
+    The delay tables and the per ROI sums are written to scratch arrays of
+    the internal state, so nothing is allocated per call.
+
+    .. warning :: This modifies inputs in place.
+
+    Parameters
+    ----------
+    delay_index : array
+        scratch for the index into the results and the buffer number of
+        every delay, shape (num_bufs, 2)
+    inv_normalize : array
+        scratch for the reciprocal of the normalization of every delay,
+        shape (num_bufs,)
+    roi_sums : array
+        scratch for the per ROI sums of every delay,
+        shape (number of ROI's, num_bufs, 3)
+
+    See `_one_time_process` for the other parameters.
+    """
+    img_per_level[level] += 1
+    i_min = num_bufs // 2 if level else 0
+    if img_per_level[level] <= i_min:
+        return
+    num_rois = G.shape[1]
+
+    # find the delays that do not involve bad images
+    future_img = buf[level, buf_no]
+    future_bad = _has_nan(future_img)
+    num_good = 0
+    for i in range(i_min, min(img_per_level[level], num_bufs)):
+        t = level * num_bufs // 2 + i
+        d = (buf_no - i) % num_bufs
+        if future_bad or _has_nan(buf[level, d]):
+            norm[t] += 1
         else:
-            for w, arr in zip([past_img*future_img, past_img, future_img],
-                              [G, past_intensity_norm, future_intensity_norm]):
-                binned = np.bincount(label_array, weights=w)[1:]
-                arr[t_index] += ((binned / num_pixels -
-                                  arr[t_index]) / normalize)
-    return None  # modifies arguments in place!
+            delay_index[num_good, 0] = t
+            delay_index[num_good, 1] = d
+            inv_normalize[num_good] = 1.0 / (img_per_level[level] - i -
+                                             norm[t])
+            num_good += 1
+
+    for q in prange(num_rois):
+        sums = roi_sums[q]
+        sums[:num_good] = 0.0
+        for start in range(roi_ptr[q], roi_ptr[q + 1], _block_size):
+            stop = min(start + _block_size, roi_ptr[q + 1])
+            for j in range(num_good):
+                g_sum, p_sum, f_sum = _roi_sums(
+                    buf[level, delay_index[j, 1]], future_img, start, stop)
+                sums[j, 0] += g_sum
+                sums[j, 1] += p_sum
+                sums[j, 2] += f_sum
+
+        # the running means only multiply, by the reciprocals of the
+        # normalizations and of the ROI sizes
+        inv_n = inv_num_pixels[q]
+        for j in range(num_good):
+            t = delay_index[j, 0]
+            G[t, q] += (sums[j, 0] * inv_n - G[t, q]) * inv_normalize[j]
+            past_intensity_norm[t, q] += (
+                (sums[j, 1] * inv_n - past_intensity_norm[t, q]) *
+                inv_normalize[j])
+            future_intensity_norm[t, q] += (
+                (sums[j, 2] * inv_n - future_intensity_norm[t, q]) *
+                inv_normalize[j])
+
+
+@njit(cache=True, fastmath=_fastmath)
+def _one_time_core(frames, buf, G, past_intensity_norm, future_intensity_norm,
+                   roi_ptr, inv_num_pixels, img_per_level, track_level, cur,
+                   norm, delay_index, inv_normalize, roi_sums):
+    """Numba implementation of the multi-tau one time correlation loop
+
+    Feeds every frame through the ring buffers of all levels, calling
+    `_one_time_process_kernel` at each level, so that no python code runs
+    between frames.
+
+    .. warning :: This modifies inputs in place.
+
+    Parameters
+    ----------
+    frames : array
+        ROI pixels of the images to correlate, as selected by the
+        ``pixel_list`` of the internal state
+        shape (number of images, number of pixels)
+    track_level : array
+        to track processing each level
+    cur : array
+        to increment the buffer
+
+    `delay_index`, `inv_normalize` and `roi_sums` are the scratch arrays
+    described in `_one_time_process_kernel`. All other parameters are
+    described in `_one_time_process`.
+    """
+    num_levels, num_bufs = buf.shape[0], buf.shape[1]
+    for n in range(frames.shape[0]):
+        # increment buffer and put the ROI pixels into the ring buffer
+        cur[0] = (1 + cur[0]) % num_bufs
+        buf[0, cur[0] - 1] = frames[n]
+        _one_time_process_kernel(buf, G, past_intensity_norm,
+                                 future_intensity_norm, roi_ptr, num_bufs,
+                                 inv_num_pixels, img_per_level, 0,
+                                 cur[0] - 1, norm, delay_index,
+                                 inv_normalize, roi_sums)
+
+        level = 1
+        while level < num_levels:
+            if not track_level[level]:
+                track_level[level] = True
+                break
+            prev = 1 + (cur[level - 1] - 2) % num_bufs
+            cur[level] = 1 + cur[level] % num_bufs
+            # average the two images of the previous level straight into
+            # the ring buffer slot, without a temporary
+            a = buf[level - 1, prev - 1]
+            b = buf[level - 1, cur[level - 1] - 1]
+            out = buf[level, cur[level] - 1]
+            for p in range(out.shape[0]):
+                out[p] = 0.5 * (a[p] + b[p])
+            track_level[level] = False
+            _one_time_process_kernel(buf, G, past_intensity_norm,
+                                     future_intensity_norm, roi_ptr,
+                                     num_bufs, inv_num_pixels,
+                                     img_per_level, level, cur[level] - 1,
+                                     norm, delay_index, inv_normalize,
+                                     roi_sums)
+            level += 1
+
+
+def _start_numba_threads():
+    """Start numba's threading layer before calling `_one_time_core`
+
+    `_one_time_core` calls the ``parallel=True``
+    `_one_time_process_kernel`. When a new process loads both from numba's
+    disk cache, nothing starts the threading layer and the first parallel
+    region crashes the interpreter. With numba 0.55 and the TBB layer,
+    running ``multi_tau_auto_corr`` on an array twice in two fresh processes
+    segfaults the second one. Asking for the number of threads starts the
+    layer; it is a no-op once it runs.
+    """
+    get_num_threads()
+
+
+def _gather_ahead(image_iterable, pixel_list, depth=2):
+    """Yield the ROI pixels of every image, read in a background thread
+
+    The next images are read and their ROI pixels gathered while the
+    caller correlates the current one, so loading lazily from disk
+    overlaps with the computation. At most `depth` gathered images are
+    held at any time. An exception raised by `image_iterable` is raised
+    again by this generator.
+
+    Parameters
+    ----------
+    image_iterable : iterable of 2D arrays
+    pixel_list : array
+        indices of the ROI pixels in the flattened images
+    depth : int, optional
+        number of images to read ahead
+
+    Yields
+    ------
+    frame : array
+        the ROI pixels of an image
+    """
+    frames = queue.Queue(maxsize=depth)
+    done = threading.Event()
+
+    def put(item):
+        # stop waiting once the consumer has gone away
+        while not done.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        # whatever happens, queue the end of the images (or the error), so
+        # the consumer never waits forever
+        end = (None, None)
+        try:
+            for image in image_iterable:
+                if not put((np.take(image, pixel_list), None)):
+                    return
+        except BaseException:
+            end = (None, sys.exc_info())
+        finally:
+            put(end)
+
+    reader = threading.Thread(target=read)
+    reader.daemon = True
+    reader.start()
+    try:
+        while True:
+            frame, exc_info = frames.get()
+            if exc_info is not None:
+                six.reraise(*exc_info)
+            if frame is None:
+                return
+            yield frame
+    finally:
+        done.set()
 
 
 results = namedtuple(
@@ -156,9 +496,13 @@ _internal_state = namedtuple(
      'cur',
      'pixel_list',
      'num_pixels',
+     'inv_num_pixels',
      'lag_steps',
      'norm',
-     'lev_len']
+     'roi_ptr',
+     'delay_index',
+     'inv_normalize',
+     'roi_sums']
 )
 
 _two_time_internal_state = namedtuple(
@@ -176,7 +520,7 @@ _two_time_internal_state = namedtuple(
      'current_img_time',
      'time_ind',
      'norm',
-     'lev_len']
+     'roi_ptr']
 )
 
 
@@ -200,7 +544,7 @@ def _init_state_one_time(num_levels, num_bufs, labels):
     """
     (label_array, pixel_list, num_rois, num_pixels, lag_steps, buf,
      img_per_level, track_level, cur, norm,
-     lev_len) = _validate_and_transform_inputs(num_bufs, num_levels, labels)
+     roi_ptr) = _validate_and_transform_inputs(num_bufs, num_levels, labels)
 
     # G holds the un normalized auto- correlation result. We
     # accumulate computations into G as the algorithm proceeds.
@@ -210,6 +554,13 @@ def _init_state_one_time(num_levels, num_bufs, labels):
     past_intensity = np.zeros_like(G)
     # matrix for normalizing G into g2
     future_intensity = np.zeros_like(G)
+    # the running means multiply by the reciprocals of the ROI sizes
+    inv_num_pixels = 1.0 / num_pixels
+    # scratch space of the numba kernel, allocated once here rather than
+    # at every level of every image
+    delay_index = np.zeros((num_bufs, 2), dtype=np.int64)
+    inv_normalize = np.zeros(num_bufs, dtype=np.float64)
+    roi_sums = np.zeros((num_rois, num_bufs, 3), dtype=np.float64)
 
     return _internal_state(
         buf,
@@ -222,14 +573,18 @@ def _init_state_one_time(num_levels, num_bufs, labels):
         cur,
         pixel_list,
         num_pixels,
+        inv_num_pixels,
         lag_steps,
         norm,
-        lev_len,
+        roi_ptr,
+        delay_index,
+        inv_normalize,
+        roi_sums,
     )
 
 
 def lazy_one_time(image_iterable, num_levels, num_bufs, labels,
-                  internal_state=None):
+                  internal_state=None, prefetch=False):
     """Generator implementation of 1-time multi-tau correlation
 
     If you do not want multi-tau correlation, set num_levels to 1 and
@@ -252,6 +607,11 @@ def lazy_one_time(image_iterable, num_levels, num_bufs, labels,
         internal_state is a bucket for all of the internal state of the
         generator. It is part of the `results` object that is yielded from
         this generator
+    prefetch : bool, optional
+        read the next images of `image_iterable` in a background thread
+        while the current one is correlated. Useful when the images are
+        loaded lazily from disk; the iterable is then read a couple of
+        images ahead of the results that are yielded.
 
     Yields
     ------
@@ -298,73 +658,113 @@ def lazy_one_time(image_iterable, num_levels, num_bufs, labels,
     # create a shorthand reference to the results and state named tuple
     s = internal_state
 
+    if _has_numba:
+        _start_numba_threads()
+
+    # only the ROI pixels of the images are kept. The kernel casts them
+    # while copying them into the ring buffer, so gathering them is the
+    # only copy made here
+    if prefetch:
+        frames = _gather_ahead(image_iterable, s.pixel_list)
+    else:
+        frames = (np.take(image, s.pixel_list) for image in image_iterable)
+
     # iterate over the images to compute multi-tau correlation
-    for image in image_iterable:
-        # Compute the correlations for all higher levels.
-        level = 0
-
-        # increment buffer
-        s.cur[0] = (1 + s.cur[0]) % num_bufs
-
-        # Put the ROI pixels into the ring buffer.
-        s.buf[0, s.cur[0] - 1] = np.ravel(image)[s.pixel_list]
-        buf_no = s.cur[0] - 1
-        # Compute the correlations between the first level
-        # (undownsampled) frames. This modifies G,
-        # past_intensity, future_intensity,
-        # and img_per_level in place!
-        _one_time_process(s.buf, s.G, s.past_intensity, s.future_intensity,
-                          s.label_array, num_bufs, s.num_pixels,
-                          s.img_per_level, level, buf_no, s.norm, s.lev_len)
+    for frame in frames:
+        if _has_numba:
+            _one_time_core(frame[np.newaxis], s.buf, s.G, s.past_intensity,
+                           s.future_intensity, s.roi_ptr, s.inv_num_pixels,
+                           s.img_per_level, s.track_level, s.cur, s.norm,
+                           s.delay_index, s.inv_normalize, s.roi_sums)
+        else:
+            # Compute the correlations for all higher levels.
+            level = 0
+
+            # increment buffer
+            s.cur[0] = (1 + s.cur[0]) % num_bufs
+
+            # Put the ROI pixels into the ring buffer.
+            s.buf[0, s.cur[0] - 1] = frame
+            buf_no = s.cur[0] - 1
+            # Compute the correlations between the first level
+            # (undownsampled) frames. This modifies G,
+            # past_intensity, future_intensity,
+            # and img_per_level in place!
+            _one_time_process(s.buf, s.G, s.past_intensity, s.future_intensity,
+                              num_bufs, s.inv_num_pixels, s.img_per_level,
+                              level, buf_no, s.norm, s.roi_ptr)
+
+            # check whether the number of levels is one, otherwise
+            # continue processing the next level
+            processing = num_levels > 1
+
+            level = 1
+            while processing:
+                if not s.track_level[level]:
+                    s.track_level[level] = True
+                    processing = False
+                else:
+                    prev = (1 + (s.cur[level - 1] - 2) % num_bufs)
+                    s.cur[level] = (
+                        1 + s.cur[level] % num_bufs)
 
-        # check whether the number of levels is one, otherwise
-        # continue processing the next level
-        processing = num_levels > 1
+                    # average straight into the ring buffer slot
+                    out = s.buf[level, s.cur[level] - 1]
+                    np.add(s.buf[level - 1, prev - 1],
+                           s.buf[level - 1, s.cur[level - 1] - 1], out=out)
+                    out *= 0.5
 
-        level = 1
-        while processing:
-            if not s.track_level[level]:
-                s.track_level[level] = True
-                processing = False
-            else:
-                prev = (1 + (s.cur[level - 1] - 2) % num_bufs)
-                s.cur[level] = (
-                    1 + s.cur[level] % num_bufs)
+                    # make the track_level zero once that level is processed
+                    s.track_level[level] = False
 
-                s.buf[level, s.cur[level] - 1] = ((
-                        s.buf[level - 1, prev - 1] +
-                        s.buf[level - 1, s.cur[level - 1] - 1]) / 2)
+                    # call processing_func for each multi-tau level greater
+                    # than one. This is modifying things in place. See comment
+                    # on previous call above.
+                    buf_no = s.cur[level] - 1
+                    _one_time_process(s.buf, s.G, s.past_intensity,
+                                      s.future_intensity, num_bufs,
+                                      s.inv_num_pixels, s.img_per_level,
+                                      level, buf_no, s.norm, s.roi_ptr)
+                    level += 1
 
-                # make the track_level zero once that level is processed
-                s.track_level[level] = False
+                    # Checking whether there is next level for processing
+                    processing = level < num_levels
 
-                # call processing_func for each multi-tau level greater
-                # than one. This is modifying things in place. See comment
-                # on previous call above.
-                buf_no = s.cur[level] - 1
-                _one_time_process(s.buf, s.G, s.past_intensity,
-                                  s.future_intensity, s.label_array, num_bufs,
-                                  s.num_pixels, s.img_per_level, level, buf_no,
-                                  s.norm, s.lev_len)
-                level += 1
+        yield results(*_one_time_g2(s), internal_state=s)
 
-                # Checking whether there is next level for processing
-                processing = level < num_levels
 
-        # If any past intensities are zero, then g2 cannot be normalized at
-        # those levels. This if/else code block is basically preventing
-        # divide-by-zero errors.
-        if len(np.where(s.past_intensity == 0)[0]) != 0:
-            g_max = np.where(s.past_intensity == 0)[0][0]
-        else:
-            g_max = s.past_intensity.shape[0]
+def _one_time_g2(state):
+    """Normalize the accumulated one time correlation of `lazy_one_time`
+
+    Parameters
+    ----------
+    state : namedtuple
+        The internal state of `lazy_one_time`
 
-        g2 = (s.G[:g_max] / (s.past_intensity[:g_max] *
-                             s.future_intensity[:g_max]))
-        yield results(g2, s.lag_steps[:g_max], s)
+    Returns
+    -------
+    g2 : array
+        the normalized correlation
+        shape is (len(lag_steps), num_rois)
+    lag_steps : array
+        the times at which the correlation was computed
+    """
+    s = state
+    # If any past intensities are zero, then g2 cannot be normalized at
+    # those levels. This if/else code block is basically preventing
+    # divide-by-zero errors.
+    if len(np.where(s.past_intensity == 0)[0]) != 0:
+        g_max = np.where(s.past_intensity == 0)[0][0]
+    else:
+        g_max = s.past_intensity.shape[0]
+
+    g2 = (s.G[:g_max] / (s.past_intensity[:g_max] *
+                         s.future_intensity[:g_max]))
+    return g2, s.lag_steps[:g_max]
 
 
-def multi_tau_auto_corr(num_levels, num_bufs, labels, images):
+def multi_tau_auto_corr(num_levels, num_bufs, labels, images,
+                        prefetch=False):
     """Wraps generator implementation of multi-tau
 
     Original code(in Yorick) for multi tau auto correlation
@@ -376,8 +776,28 @@ def multi_tau_auto_corr(num_levels, num_bufs, labels, images):
     signature here for backwards compatibility, but is the first argument in
     the `lazy_one_time()` function. The semantics of the variables remain
     unchanged.
+
+    When numba is available and `images` is an array, the whole stack is
+    correlated in one call to the compiled kernel instead of going through
+    the generator. Any other iterable, e.g. images read lazily from disk,
+    is streamed through the generator, so the whole stack never has to be
+    in memory; pass ``prefetch=True`` to read the next images ahead in a
+    background thread (see `lazy_one_time`).
     """
-    gen = lazy_one_time(images, num_levels, num_bufs, labels)
+    if _has_numba and isinstance(images, np.ndarray):
+        _start_numba_threads()
+        s = _init_state_one_time(num_levels, num_bufs, labels)
+        # gather the ROI pixels of every image at once
+        frames = np.take(images.reshape(len(images), -1), s.pixel_list,
+                         axis=1)
+        _one_time_core(frames, s.buf, s.G, s.past_intensity,
+                       s.future_intensity, s.roi_ptr, s.inv_num_pixels,
+                       s.img_per_level, s.track_level, s.cur, s.norm,
+                       s.delay_index, s.inv_normalize, s.roi_sums)
+        return _one_time_g2(s)
+
+    gen = lazy_one_time(images, num_levels, num_bufs, labels,
+                        prefetch=prefetch)
     for result in gen:
         pass
     return result.g2, result.lag_steps
@@ -545,10 +965,11 @@ def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1,
 
         # Compute the two time correlations between the first level
         # (undownsampled) frames. two_time and img_per_level in place!
-        _two_time_process(s.buf, s.g2, s.label_array, num_bufs,
+        _two_time_process(s.buf, s.g2, num_bufs,
                           s.num_pixels, s.img_per_level, s.lag_steps,
                           s.current_img_time,
-                          level=0, buf_no=s.cur[0] - 1)
+                          level=0, buf_no=s.cur[0] - 1,
+                          roi_ptr=s.roi_ptr)
 
         # time frame for each level
         s.time_ind[0].append(s.current_img_time)
@@ -568,9 +989,11 @@ def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1,
                 s.cur[level] = 1 + s.cur[level] % num_bufs
                 s.count_level[level] = 1 + s.count_level[level]
 
-                s.buf[level, s.cur[level] - 1] = (s.buf[level - 1, prev - 1] +
-                                                  s.buf[level - 1,
-                                                  s.cur[level - 1] - 1])/2
+                # average straight into the ring buffer slot
+                out = s.buf[level, s.cur[level] - 1]
+                np.add(s.buf[level - 1, prev - 1],
+                       s.buf[level - 1, s.cur[level - 1] - 1], out=out)
+                out *= 0.5
 
                 t1_idx = (s.count_level[level] - 1) * 2
 
@@ -587,10 +1010,11 @@ def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1,
                 # for multi-tau levels greater than one
                 # Again, this is modifying things in place. See comment
                 # on previous call above.
-                _two_time_process(s.buf, s.g2, s.label_array, num_bufs,
+                _two_time_process(s.buf, s.g2, num_bufs,
                                   s.num_pixels, s.img_per_level, s.lag_steps,
                                   current_img_time,
-                                  level=level, buf_no=s.cur[level]-1)
+                                  level=level, buf_no=s.cur[level]-1,
+                                  roi_ptr=s.roi_ptr)
                 level += 1
 
                 # Checking whether there is next level for processing
@@ -619,9 +1043,8 @@ def two_time_state_to_results(state):
     return results(state.g2, state.lag_steps, state)
 
 
-def _two_time_process(buf, g2, label_array, num_bufs, num_pixels,
-                      img_per_level, lag_steps, current_img_time,
-                      level, buf_no):
+def _two_time_process(buf, g2, num_bufs, num_pixels, img_per_level,
+                      lag_steps, current_img_time, level, buf_no, roi_ptr):
     """
     Parameters
     ----------
@@ -630,15 +1053,11 @@ def _two_time_process(buf, g2, label_array, num_bufs, num_pixels,
     g2: array
         two time correlation matrix
         shape (number of labels(ROI), number of frames, number of frames)
-    label_array: array
-        Elements not inside any ROI are zero; elements inside each
-        ROI are 1, 2, 3, etc. corresponding to the order they are specified
-        in edges and segments
     num_bufs: int, even
         number of buffers(channels)
     num_pixels : array
         number of pixels in certain ROI's
-        ROI's, dimensions are len(np.unique(label_array))
+        ROI's, dimensions are : [number of ROI's]
     img_per_level: array
         to track how many images processed in each level
     lag_steps : array
@@ -650,6 +1069,9 @@ def _two_time_process(buf, g2, label_array, num_bufs, num_pixels,
         the current multi-tau level
     buf_no : int
         the current buffer number
+    roi_ptr : array
+        the pixels of ROI ``q`` are ``roi_ptr[q]:roi_ptr[q + 1]`` in the
+        (ROI sorted) images of `buf`
     """
     img_per_level[level] += 1
 
@@ -668,16 +1090,14 @@ def _two_time_process(buf, g2, label_array, num_bufs, num_pixels,
         past_img = buf[level, delay_no]
         future_img = buf[level, buf_no]
 
-        #  get the matrix of correlation function without normalizations
-        tmp_binned = (np.bincount(label_array,
-                                  weights=past_img*future_img)[1:])
-        # get the matrix of past intensity normalizations
-        pi_binned = (np.bincount(label_array,
-                                 weights=past_img)[1:])
-
-        # get the matrix of future intensity normalizations
-        fi_binned = (np.bincount(label_array,
-                                 weights=future_img)[1:])
+        # get the matrix of correlation function without normalizations
+        # and the matrices of past and future intensity normalizations,
+        # in double precision
+        weights = np.vstack((
+            np.multiply(past_img, future_img, dtype=np.float64), past_img,
+            future_img))
+        tmp_binned, pi_binned, fi_binned = np.add.reduceat(
+            weights, roi_ptr[:-1], axis=1)
 
         tind1 = (current_img_time - 1)
 
@@ -714,7 +1134,7 @@ def _init_state_two_time(num_levels, num_bufs, labels, num_frames):
     """
     (label_array, pixel_list, num_rois, num_pixels, lag_steps,
      buf, img_per_level, track_level, cur, norm,
-     lev_len) = _validate_and_transform_inputs(num_bufs, num_levels, labels)
+     roi_ptr) = _validate_and_transform_inputs(num_bufs, num_levels, labels)
 
     # to count images in each level
     count_level = np.zeros(num_levels, dtype=np.int64)
@@ -742,7 +1162,7 @@ def _init_state_two_time(num_levels, num_bufs, labels, num_frames):
         current_img_time,
         time_ind,
         norm,
-        lev_len,
+        roi_ptr,
     )
 
 
@@ -762,11 +1182,11 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
     Returns
     -------
     label_array : array
-        labels of the required region of interests(ROI's)
+        labels of the required region of interests(ROI's), sorted
     pixel_list : array
         1D array of indices into the raveled image for all
-        foreground pixels (labeled nonzero)
-        e.g., [5, 6, 7, 8, 14, 15, 21, 22]
+        foreground pixels (labeled nonzero), sorted by ROI
+        e.g., [5, 6, 7, 8, 21, 22, 14, 15]
     num_rois : int
         number of region of interests (ROI)
     num_pixels : array
@@ -774,48 +1194,61 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
     lag_steps : array
         the times at which the correlation was computed
     buf : array
-        image data for correlation
+        ring buffer of image data for correlation
+        shape (num_levels, num_bufs, number of pixels)
+        The images are stored in single precision, which halves the memory
+        traffic of the correlation loops; all sums are accumulated in
+        double precision.
+        The last axis follows `pixel_list`, so it is ROI sorted: each
+        (level, buffer) image holds every ROI as one contiguous run of
+        pixels, ``roi_ptr[q]:roi_ptr[q + 1]``. The per ROI reductions rely
+        on this layout to stream through memory.
     img_per_level : array
         to track how many images processed in each level
     track_level : array
         to track processing each level
     cur : array
         to increment the buffer
-    norm : dict
-        to track bad images
-    lev_len : array
-        length of each levels
+    norm : array
+        number of bad images skipped at each lag
+    roi_ptr : array
+        the pixels of ROI ``q`` are ``roi_ptr[q]:roi_ptr[q + 1]`` in
+        `pixel_list` and `label_array`
     """
     if num_bufs % 2 != 0:
         raise ValueError("There must be an even number of `num_bufs`. You "
                          "provided %s" % num_bufs)
     label_array, pixel_list = extract_label_indices(labels)
 
-    # map the indices onto a sequential list of integers starting at 1
-    label_mapping = {label: n+1
-                     for n, label in enumerate(np.unique(label_array))}
-    # remap the label array to go from 1 -> max(_labels)
-    for label, n in label_mapping.items():
-        label_array[label_array == label] = n
+    # map the indices onto a sequential list of integers starting at 1,
+    # in one pass rather than one masked assignment per label
+    unique_labels, label_array = np.unique(label_array, return_inverse=True)
+    label_array += 1
 
     # number of ROI's
-    num_rois = len(label_mapping)
+    num_rois = len(unique_labels)
 
     # stash the number of pixels in the mask
     num_pixels = np.bincount(label_array)[1:]
 
+    # sort the pixels by ROI, so that each ROI is a contiguous run of the
+    # ring buffer images and can be summed with a streaming reduction
+    order = np.argsort(label_array, kind='mergesort')
+    label_array = label_array[order]
+    pixel_list = pixel_list[order]
+    roi_ptr = np.concatenate(([0], np.cumsum(num_pixels)))
+
     # Convert from num_levels, num_bufs to lag frames.
     tot_channels, lag_steps, dict_lag = multi_tau_lags(num_levels, num_bufs)
 
-    # these norm and lev_len will help to find the one time correlation
-    # normalization norm will updated when there is a bad image
-    norm = {key: [0] * len(dict_lag[key]) for key in (dict_lag.keys())}
-    lev_len = np.array([len(dict_lag[i]) for i in (dict_lag.keys())])
+    # norm will help to find the one time correlation normalization,
+    # it is updated when there is a bad image
+    norm = np.zeros(len(lag_steps), dtype=np.int64)
 
     # Ring buffer, a buffer with periodic boundary conditions.
     # Images must be keep for up to maximum delay in buf.
     buf = np.zeros((num_levels, num_bufs, len(pixel_list)),
-                   dtype=np.float64)
+                   dtype=np.float32)
     # to track how many images processed in each level
     img_per_level = np.zeros(num_levels, dtype=np.int64)
     # to track which levels have already been processed
@@ -825,7 +1258,7 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
 
     return (label_array, pixel_list, num_rois, num_pixels,
             lag_steps, buf, img_per_level, track_level, cur,
-            norm, lev_len)
+            norm, roi_ptr)
 
 
 def one_time_from_two_time(two_time_corr):
@@ -517,15 +517,13 @@ def extract_label_indices(labels):
         foreground pixels (labeled nonzero)
         e.g., [5, 6, 7, 8, 14, 15, 21, 22]
     """
-    img_dim = labels.shape
-
-    # TODO Make this tighter.
-    w = np.where(np.ravel(labels) > 0)
-    grid = np.indices((img_dim[0], img_dim[1]))
-    pixel_list = np.ravel((grid[0] * img_dim[1] + grid[1]))[w]
+    # index the raveled image directly, instead of building row and column
+    # index grids of the whole image
+    flat = np.ravel(labels)
+    pixel_list = np.flatnonzero(flat > 0)
 
     # discard the zeros
-    label_mask = labels[labels > 0]
+    label_mask = flat[pixel_list]
 
     return label_mask, pixel_list
 
@@ -40,6 +40,7 @@ from numpy.testing import assert_array_almost_equal
 from nose.tools import assert_raises, assert_equal
 
 import skbeam.core.utils as utils
+import skbeam.core.correlation as corr
 from skbeam.core.correlation import (multi_tau_auto_corr,
                                      auto_corr_scat_factor,
                                      lazy_one_time,
@@ -158,6 +159,58 @@ def test_lazy_one_time():
                   second_half_result.g2)
 
 
+def test_lazy_one_time_reuses_state():
+    setup()
+    names = ('buf', 'G', 'past_intensity', 'future_intensity', 'norm')
+    gen_first_half = lazy_one_time(img_stack[:stack_size//2], 4, num_bufs,
+                                   rois)
+    for first_half_result in gen_first_half:
+        pass
+    state = first_half_result.internal_state
+    assert_equal(state.G.shape, ((4 + 1) * num_bufs // 2, 2))
+    addresses = [getattr(state, name).ctypes.data for name in names]
+
+    # streaming the next batch accumulates into the same memory
+    gen_second_half = lazy_one_time(img_stack[stack_size//2:], 4, num_bufs,
+                                    rois, internal_state=state)
+    for second_half_result in gen_second_half:
+        pass
+    assert_equal([getattr(state, name).ctypes.data for name in names],
+                 addresses)
+
+    # and gives the same result as a single run over the full stack
+    for full_result in lazy_one_time(img_stack, 4, num_bufs, rois):
+        pass
+    for name in names:
+        assert_array_almost_equal(getattr(state, name),
+                                  getattr(full_result.internal_state, name))
+
+
+def test_lazy_one_time_prefetch():
+    setup()
+    for result in lazy_one_time(img_stack, num_levels, num_bufs, rois):
+        pass
+    for prefetched in lazy_one_time(iter(img_stack), num_levels, num_bufs,
+                                    rois, prefetch=True):
+        pass
+    assert_array_almost_equal(prefetched.g2, result.g2)
+
+    # errors raised while reading the images reach the caller, including
+    # exceptions that do not derive from Exception
+    class Abort(BaseException):
+        pass
+
+    for error in (IOError, Abort):
+        def failing_images():
+            yield img_stack[0]
+            raise error('unreadable frame')
+
+        with assert_raises(error):
+            for result in lazy_one_time(failing_images(), num_levels,
+                                        num_bufs, rois, prefetch=True):
+                pass
+
+
 def test_two_time_corr():
     setup()
     y = []
@@ -202,6 +255,53 @@ def test_bad_images():
     assert_array_almost_equal(g2[:, 1], g2_n[:, 1], decimal=3)
 
 
+def test_one_time_numba_vs_reference():
+    np.random.seed(42)
+    images = np.random.randint(0, 10, (50, 20, 30))
+    labels = np.zeros((20, 30), dtype=np.int64)
+    labels[2:8, 3:12] = 4
+    labels[10:18, 5:25] = 2
+    # an ROI interleaved with the others
+    labels[::3, ::4] = 7
+    bad_img_list = [5, 17, 30]
+
+    # the images with bad images go through the generator, the plain image
+    # stack through the whole stack path of multi_tau_auto_corr
+    g2s = {}
+    for use_numba in (False, True):
+        has_numba = corr._has_numba
+        corr._has_numba = use_numba
+        try:
+            g2s[use_numba] = [
+                multi_tau_auto_corr(4, 6, labels,
+                                    bad_to_nan_gen(images, bad_img_list))[0],
+                multi_tau_auto_corr(4, 6, labels, images)[0]]
+        finally:
+            corr._has_numba = has_numba
+
+    for g2, g2_numba in zip(g2s[False], g2s[True]):
+        assert_array_almost_equal(g2, g2_numba, decimal=12)
+
+
+def test_roi_sorted_buffer_layout():
+    labels = np.zeros((20, 30), dtype=np.int64)
+    labels[2:8, 3:12] = 4
+    labels[10:18, 5:25] = 2
+    labels[::3, ::4] = 7
+    state = corr._init_state_one_time(3, 4, labels)
+
+    # every ROI is one contiguous run of the buffered images
+    assert_equal(len(state.roi_ptr), state.G.shape[1] + 1)
+    assert_equal(state.roi_ptr[-1], state.buf.shape[-1])
+    for q in range(state.G.shape[1]):
+        start, stop = state.roi_ptr[q], state.roi_ptr[q + 1]
+        assert_equal(stop - start, state.num_pixels[q])
+        assert np.all(state.label_array[start:stop] == q + 1)
+        # and the run holds the pixels of a single original label
+        assert_equal(len(np.unique(
+            np.ravel(labels)[state.pixel_list[start:stop]])), 1)
+
+
 def test_one_time_from_two_time():
     num_lev = 1
     num_buf = 10  # must be even